@@ -18,7 +18,9 @@ from __future__ import (
 from .collection import Collection
 from .spreadsheet import Spreadsheet
 from .util import SCOPES
+from .util import serial_to_datetime
 from .view import View
+from .view import fetch_all
 from .worksheet import Worksheet
 
 login = Collection.login
@@ -31,5 +33,7 @@ __all__ = [
     'Spreadsheet',
     'View',
     'Worksheet',
+    'fetch_all',
     'login',
+    'serial_to_datetime',
 ]
@@ -17,16 +17,39 @@ from __future__ import (
 
 import googleapiclient.discovery
 
+from . import py3
 from . import schema
 
 
 SHEETS_API_DISCOVERY_URL = (
     'https://sheets.googleapis.com/$discovery/rest?version=v4')
 
+# Fields of spreadsheet resources read by hyou.
+SPREADSHEET_FIELDS = (
+    'spreadsheetId',
+    'properties/title',
+    'sheets/properties(sheetId,title,index,gridProperties)',
+)
+
+# Fields of Drive file resources read by hyou.
+FILE_FIELDS = (
+    'modifiedDate',
+)
+
 
 class API(object):
+    """Sheets and Drive API clients.
+
+    Metadata requests only ask for the fields hyou reads. Additional fields
+    can be requested with |extra_spreadsheet_fields| and |extra_file_fields|,
+    e.g. ('sheets/protectedRanges',).
+    """
 
-    def __init__(self, http, discovery):
+    def __init__(self, http, discovery, extra_spreadsheet_fields=(),
+                 extra_file_fields=()):
+        self.spreadsheet_fields = ','.join(
+            SPREADSHEET_FIELDS + tuple(extra_spreadsheet_fields))
+        self.file_fields = ','.join(FILE_FIELDS + tuple(extra_file_fields))
         if discovery:
             self.sheets = googleapiclient.discovery.build(
                 'sheets', 'v4', http=http,
@@ -38,3 +61,29 @@ class API(object):
                 schema.SHEETS_V4, http=http)
             self.drive = googleapiclient.discovery.build_from_document(
                 schema.DRIVE_V2, http=http)
+
+    def get_spreadsheet(self, key, ranges=None):
+        """Gets a spreadsheet, limiting sheets to |ranges| if given."""
+        params = {}
+        if ranges is not None:
+            params['ranges'] = [
+                py3.str_to_native_str(range_str, encoding='utf-8')
+                for range_str in ranges]
+        return self.sheets.spreadsheets().get(
+            spreadsheetId=key, includeGridData=False,
+            fields=self.spreadsheet_fields, **params).execute()
+
+    def batch_update_spreadsheet(self, key, requests, include_spreadsheet):
+        body = {'requests': requests}
+        if not include_spreadsheet:
+            return self.sheets.spreadsheets().batchUpdate(
+                spreadsheetId=key, body=body).execute()
+        body['include_spreadsheet_in_response'] = True
+        return self.sheets.spreadsheets().batchUpdate(
+            spreadsheetId=key, body=body,
+            fields='spreadsheetId,replies,updatedSpreadsheet(%s)' % (
+                self.spreadsheet_fields,)).execute()
+
+    def get_file(self, key):
+        return self.drive.files().get(
+            fileId=key, fields=self.file_fields).execute()
@@ -32,13 +32,17 @@ class Collection(util.LazyOrderedDictionary):
         self._api = api
 
     @classmethod
-    def login(cls, json_path=None, json_text=None, discovery=False):
+    def login(cls, json_path=None, json_text=None, discovery=False,
+              extra_spreadsheet_fields=(), extra_file_fields=()):
         if json_text is None:
             with py3.open(json_path, 'r') as f:
                 json_text = f.read()
         credentials = util.parse_credentials(json_text)
         http = credentials.authorize(httplib2.Http())
-        return cls(api.API(http, discovery=discovery))
+        return cls(api.API(
+            http, discovery=discovery,
+            extra_spreadsheet_fields=extra_spreadsheet_fields,
+            extra_file_fields=extra_file_fields))
 
     def create_spreadsheet(self, title, rows=1000, cols=26):
         body = {
@@ -53,17 +57,26 @@ class Collection(util.LazyOrderedDictionary):
         return spreadsheet
 
     def _spreadsheet_enumerator(self):
-        response = self._api.drive.files().list(
-            maxResults=1000,
-            q=('mimeType="application/vnd.google-apps.spreadsheet" and '
-               'trashed = false'),
-            fields='items/id').execute()
-        for item in response['items']:
-            key = item['id']
-            yield (key, spreadsheet.Spreadsheet(self._api, key, None))
+        # Pages are fetched as entries are consumed.
+        page_token = None
+        while True:
+            params = {}
+            if page_token is not None:
+                params['pageToken'] = page_token
+            response = self._api.drive.files().list(
+                maxResults=1000,
+                q=('mimeType="application/vnd.google-apps.spreadsheet" and '
+                   'trashed = false'),
+                fields='items/id,nextPageToken',
+                **params).execute()
+            for item in response.get('items', []):
+                key = item['id']
+                yield (key, spreadsheet.Spreadsheet(self._api, key, None))
+            page_token = response.get('nextPageToken')
+            if not page_token:
+                break
 
     def _spreadsheet_constructor(self, key):
-        entry = self._api.sheets.spreadsheets().get(
-            spreadsheetId=key, includeGridData=False).execute()
+        entry = self._api.get_spreadsheet(key)
         return spreadsheet.Spreadsheet(
             self._api, entry['spreadsheetId'], entry)
@@ -15,34 +15,163 @@
 from __future__ import (
     absolute_import, division, print_function, unicode_literals)
 
+import collections
+import contextlib
+import copy
 import datetime
 
+import googleapiclient.errors
+
+from . import exception
+from . import py3
 from . import util
 from . import worksheet
 
 
 class Spreadsheet(util.LazyOrderedDictionary):
 
+    __slots__ = (
+        '_api', '_key', '_entry', '_updated', '_write_batch_views',
+        '_batch_requests', '_local_metadata_updates', '_worksheets')
+
     def __init__(self, api, key, entry):
         super(Spreadsheet, self).__init__(self._worksheet_enumerator, None)
         self._api = api
         self._key = str(key)
         self._entry = entry
         self._updated = None
+        self._write_batch_views = None
+        self._batch_requests = None
+        self._local_metadata_updates = False
+        # Worksheet objects by sheet ID. They are reused and updated in place
+        # on refresh.
+        self._worksheets = {}
 
     def __repr__(self):
         return str('Spreadsheet(key=%r)') % (self.key,)
 
     def refresh(self, entry=None):
+        """Refreshes metadata of the spreadsheet and all its worksheets."""
         if entry is not None:
             self._entry = entry
         else:
-            self._entry = self._api.sheets.spreadsheets().get(
-                spreadsheetId=self.key, includeGridData=False).execute()
+            self._entry = self._api.get_spreadsheet(self.key)
         self._updated = None
+        worksheets = self._worksheets
+        self._worksheets = {}
+        for sheet_entry in self._entry['sheets']:
+            sheet_id = sheet_entry['properties']['sheetId']
+            aworksheet = worksheets.get(sheet_id)
+            if aworksheet is not None:
+                aworksheet.refresh(sheet_entry)
+                # Cell values may also have changed on the server.
+                if entry is None:
+                    aworksheet._invalidate_cell_caches()
+                self._worksheets[sheet_id] = aworksheet
         super(Spreadsheet, self).refresh()
 
+    @contextlib.contextmanager
+    def write_batch(self):
+        """Defers commits of views created in the block until it exits.
+
+        Queued updates of all those views are then sent in one request.
+        Nothing is sent if the block raises an exception.
+        """
+        if self._write_batch_views is not None:
+            yield
+            return
+        views = self._write_batch_views = []
+        try:
+            yield
+        finally:
+            self._write_batch_views = None
+            for aview in views:
+                aview._write_batch = None
+        # Views sliced from another view share its queued updates, which must
+        # be sent only once.
+        queue_ids = set()
+        unique_views = []
+        for aview in views:
+            if id(aview._queued_updates) not in queue_ids:
+                queue_ids.add(id(aview._queued_updates))
+                unique_views.append(aview)
+        views = unique_views
+        # One request is needed for each value input option.
+        views_by_option = collections.OrderedDict()
+        for aview in views:
+            views_by_option.setdefault(aview._value_input_option, []).append(
+                (aview, aview._make_update_rects()))
+        for value_input_option, view_rects in views_by_option.items():
+            data = []
+            for aview, rects in view_rects:
+                data.extend(aview._make_update_data(rects))
+            if data:
+                self._batch_update_values(data, value_input_option)
+            for aview, rects in view_rects:
+                aview._set_committed(rects)
+
+    @contextlib.contextmanager
+    def batch(self):
+        """Defers metadata changes made in the block until it exits.
+
+        Changes to properties of the spreadsheet and its worksheets are applied
+        locally and sent in one request on exit, followed by a single metadata
+        refresh. Worksheets added in the block are available after it exits.
+        Nothing is sent if the block raises an exception, and local changes are
+        reverted if the block or the request fails.
+        """
+        if self._batch_requests is not None:
+            yield
+            return
+        self._ensure_entry()
+        # Properties are changed locally in the block, including those of
+        # worksheets first accessed in it.
+        entries = collections.OrderedDict(
+            (id(entry), entry)
+            for entry in [self._entry] + self._entry['sheets'] + [
+                aworksheet._entry
+                for aworksheet in self._worksheets.values()])
+        saved_properties = [
+            (entry, copy.deepcopy(entry['properties']))
+            for entry in entries.values()]
+        requests = self._batch_requests = []
+        try:
+            yield
+            new_entry = (
+                self._send_metadata_requests(requests) if requests else None)
+        except Exception:
+            for entry, properties in saved_properties:
+                entry['properties'] = properties
+            self._reindex_worksheets()
+            raise
+        finally:
+            self._batch_requests = None
+        if new_entry is not None:
+            self.refresh(new_entry)
+
+    def clear_ranges(self, views):
+        """Clears cells of views with one request.
+
+        Queued updates of the views are discarded.
+        """
+        views = [aview for aview in views if aview.rows and aview.cols]
+        ranges = []
+        for aview in views:
+            arange = util.format_range_a1_notation(
+                aview._worksheet.title, aview.start_row, aview.end_row,
+                aview.start_col, aview.end_col)
+            if aview._worksheet._spreadsheet.key != self.key:
+                raise ValueError('%s is not in this spreadsheet' % arange)
+            ranges.append(arange)
+        if not views:
+            return
+        self._api.sheets.spreadsheets().values().batchClear(
+            spreadsheetId=self.key, body={'ranges': ranges}).execute()
+        for aview in views:
+            aview._set_cleared()
+
     def add_worksheet(self, title, rows=1000, cols=26):
+        """Adds a worksheet and returns it, or None in Spreadsheet.batch()."""
         new_entry = self._make_single_batch_request(
             'addSheet',
             {
@@ -54,6 +183,8 @@ class Spreadsheet(util.LazyOrderedDictionary):
                     },
                 },
             })
+        if new_entry is None:
+            return None
         self.refresh(new_entry)
         return self[title]
 
@@ -62,7 +193,8 @@ class Spreadsheet(util.LazyOrderedDictionary):
         new_entry = self._make_single_batch_request(
             'deleteSheet',
             {'sheetId': worksheet.key})
-        self.refresh(new_entry)
+        if new_entry is not None:
+            self.refresh(new_entry)
 
     @property
     def key(self):
@@ -87,12 +219,31 @@ class Spreadsheet(util.LazyOrderedDictionary):
                 },
                 'fields': 'title',
             })
-        self.refresh(new_entry)
+        if new_entry is None:
+            self._entry['properties']['title'] = new_title
+        else:
+            self.refresh(new_entry)
+
+    @property
+    def local_metadata_updates(self):
+        """Whether metadata changes are applied to the cached entry locally.
+
+        If false (default), requests changing metadata download the whole
+        updated spreadsheet to replace the cached entry. If true, the known
+        changes are applied to the cached entry instead, so responses stay
+        small on spreadsheets with many worksheets.
+        """
+        return self._local_metadata_updates
+
+    @local_metadata_updates.setter
+    def local_metadata_updates(self, local_metadata_updates):
+        util.check_type(local_metadata_updates, bool)
+        self._local_metadata_updates = local_metadata_updates
 
     @property
     def updated(self):
         if not self._updated:
-            response = self._api.drive.files().get(fileId=self.key).execute()
+            response = self._api.get_file(self.key)
             self._updated = datetime.datetime.strptime(
                 response['modifiedDate'], '%Y-%m-%dT%H:%M:%S.%fZ')
         return self._updated
@@ -104,14 +255,138 @@ class Spreadsheet(util.LazyOrderedDictionary):
     def _worksheet_enumerator(self):
         self._ensure_entry()
         for sheet_entry in self._entry['sheets']:
-            aworksheet = worksheet.Worksheet(self, self._api, sheet_entry)
+            sheet_id = sheet_entry['properties']['sheetId']
+            aworksheet = self._worksheets.get(sheet_id)
+            if aworksheet is None:
+                aworksheet = self._worksheets[sheet_id] = worksheet.Worksheet(
+                    self, self._api, sheet_entry)
             yield (aworksheet.title, aworksheet)
 
-    def _make_single_batch_request(self, method, params):
+    def _refresh_worksheet(self, aworksheet):
+        """Refreshes metadata of a single worksheet.
+
+        Only the worksheet is fetched, unless it has been renamed, in which
+        case the whole spreadsheet is refreshed.
+        """
+        self._ensure_entry()
+        try:
+            entry = self._api.get_spreadsheet(
+                self.key, ranges=['\'%s\'' % aworksheet.title.replace(
+                    '\'', '\'\'')])
+        except googleapiclient.errors.HttpError as e:
+            # The title is no longer valid.
+            if e.resp.status != 400:
+                raise
+            entry = {'sheets': []}
+        for sheet_entry in entry.get('sheets', []):
+            if sheet_entry['properties']['sheetId'] == aworksheet.key:
+                break
+        else:
+            self.refresh()
+            if aworksheet.key not in self._worksheets:
+                raise exception.HyouRuntimeError('The sheet has been removed.')
+            return
+        self._entry['sheets'] = [
+            sheet_entry
+            if old_entry['properties']['sheetId'] == aworksheet.key
+            else old_entry
+            for old_entry in self._entry['sheets']]
+        aworksheet.refresh(sheet_entry)
+        # The title may have changed.
+        self._reindex_worksheets()
+
+    def _reindex_worksheets(self):
+        # Worksheets are looked up by title, so they must be enumerated again
+        # after a title changes.
+        super(Spreadsheet, self).refresh()
+
+    def _batch_get_values(self, ranges, render_options):
+        value_render_option, date_time_render_option = render_options
+        response = self._api.sheets.spreadsheets().values().batchGet(
+            spreadsheetId=self.key,
+            ranges=[
+                py3.str_to_native_str(range_str, encoding='utf-8')
+                for range_str in ranges],
+            majorDimension='ROWS',
+            valueRenderOption=value_render_option,
+            dateTimeRenderOption=date_time_render_option).execute()
+        return [
+            value_range.get('values', [])
+            for value_range in response['valueRanges']]
+
+    def _batch_update_values(self, data, value_input_option,
+                             response_render_options=None):
         request = {
-            'requests': [{method: params}],
-            'include_spreadsheet_in_response': True,
+            'data': data,
+            'valueInputOption': value_input_option,
+            'includeValuesInResponse': response_render_options is not None,
         }
-        response = self._api.sheets.spreadsheets().batchUpdate(
+        if response_render_options is not None:
+            request['responseValueRenderOption'] = response_render_options[0]
+            request['responseDateTimeRenderOption'] = (
+                response_render_options[1])
+        return self._api.sheets.spreadsheets().values().batchUpdate(
             spreadsheetId=self.key, body=request).execute()
-        return response['updatedSpreadsheet']
+
+    def _make_single_batch_request(self, method, params):
+        # In Spreadsheet.batch(), the request is queued and None is returned.
+        if self._batch_requests is not None:
+            self._batch_requests.append({method: params})
+            return None
+        return self._send_metadata_requests([{method: params}])
+
+    def _send_metadata_requests(self, requests):
+        """Sends requests changing metadata and returns the new entry."""
+        if not (self._local_metadata_updates and all(
+                method in _METADATA_PATCHERS
+                for request in requests for method in request)):
+            response = self._batch_update(requests, include_spreadsheet=True)
+            return response['updatedSpreadsheet']
+        self._ensure_entry()
+        response = self._batch_update(requests)
+        entry = self._entry
+        for request, reply in py3.zip(requests, response['replies']):
+            for method, params in request.items():
+                _METADATA_PATCHERS[method](entry, params, reply)
+        return entry
+
+    def _batch_update(self, requests, include_spreadsheet=False):
+        return self._api.batch_update_spreadsheet(
+            self.key, requests, include_spreadsheet)
+
+
+def _find_sheet_entry(entry, sheet_id):
+    for sheet_entry in entry['sheets']:
+        if sheet_entry['properties']['sheetId'] == sheet_id:
+            return sheet_entry
+    raise exception.HyouRuntimeError('The sheet has been removed.')
+
+
+def _patch_spreadsheet_properties(entry, params, reply):
+    util.merge_dict(entry['properties'], params['properties'])
+
+
+def _patch_sheet_properties(entry, params, reply):
+    sheet_entry = _find_sheet_entry(entry, params['properties']['sheetId'])
+    util.merge_dict(sheet_entry['properties'], params['properties'])
+
+
+def _patch_add_sheet(entry, params, reply):
+    entry['sheets'].append(
+        {'properties': reply['addSheet']['properties']})
+
+
+def _patch_delete_sheet(entry, params, reply):
+    entry['sheets'].remove(_find_sheet_entry(entry, params['sheetId']))
+    for index, sheet_entry in enumerate(entry['sheets']):
+        sheet_entry['properties']['index'] = index
+
+
+# Functions applying the change made by a batchUpdate request to a cached
+# spreadsheet entry, keyed by request type.
+_METADATA_PATCHERS = {
+    'updateSpreadsheetProperties': _patch_spreadsheet_properties,
+    'updateSheetProperties': _patch_sheet_properties,
+    'addSheet': _patch_add_sheet,
+    'deleteSheet': _patch_delete_sheet,
+}
@@ -15,7 +15,10 @@
 from __future__ import (
     absolute_import, division, print_function, unicode_literals)
 
+import datetime
 import json
+import sys
+import threading
 
 import oauth2client.client
 import oauth2client.service_account
@@ -30,6 +33,9 @@ SCOPES = (
     'https://www.googleapis.com/auth/drive',
 )
 
+# Day 0 of serial numbers used for dates in spreadsheets.
+SERIAL_NUMBER_EPOCH = datetime.datetime(1899, 12, 30)
+
 
 def check_type(value, expected_type):
     if not isinstance(value, expected_type):
@@ -38,6 +44,11 @@ def check_type(value, expected_type):
                 expected_type.__name__, type(value).__name__))
 
 
+def serial_to_datetime(serial):
+    """Converts a SERIAL_NUMBER date/time value to a datetime."""
+    return SERIAL_NUMBER_EPOCH + datetime.timedelta(days=serial)
+
+
 def format_column_address(index_column):
     letters = []
     while index_column >= 0:
@@ -56,6 +67,47 @@ def format_range_a1_notation(
         end_row)
 
 
+def coalesce_cells(cells):
+    """Merges a mapping of (row, col) -> value into rectangles.
+
+    Returns a list of (start_row, end_row, start_col, end_col, values) tuples
+    where values is a list of rows. Contiguous cells in a row are merged
+    first, then runs covering the same columns in adjacent rows are stacked.
+    """
+    runs_by_row = {}
+    for row, col in sorted(cells):
+        runs = runs_by_row.setdefault(row, [])
+        if runs and runs[-1][1] == col:
+            runs[-1][1] = col + 1
+            runs[-1][2].append(cells[(row, col)])
+        else:
+            runs.append([col, col + 1, [cells[(row, col)]]])
+    rects = []
+    open_rects = {}  # (start_col, end_col) -> rect ending at the last row
+    for row in sorted(runs_by_row):
+        next_open_rects = {}
+        for start_col, end_col, values in runs_by_row[row]:
+            rect = open_rects.get((start_col, end_col))
+            if rect is not None and rect[1] == row:
+                rect[1] = row + 1
+                rect[4].append(values)
+            else:
+                rect = [row, row + 1, start_col, end_col, [values]]
+                rects.append(rect)
+            next_open_rects[(start_col, end_col)] = rect
+        open_rects = next_open_rects
+    return [tuple(rect) for rect in rects]
+
+
+def merge_dict(dest, src):
+    """Recursively updates |dest| with values in |src|."""
+    for key, value in src.items():
+        if isinstance(value, dict) and isinstance(dest.get(key), dict):
+            merge_dict(dest[key], value)
+        else:
+            dest[key] = value
+
+
 def parse_credentials(json_text):
     json_data = json.loads(json_text)
     if '_module' in json_data:
@@ -70,19 +122,128 @@ def parse_credentials(json_text):
     raise ValueError('unrecognized credential format')
 
 
+class _BackgroundCall(object):
+
+    def __init__(self, func, arg):
+        self._func = func
+        self._arg = arg
+        self._result = None
+        self._exc_info = None
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self):
+        try:
+            self._result = self._func(self._arg)
+        except Exception:
+            self._exc_info = sys.exc_info()
+
+    def result(self):
+        self._thread.join()
+        if self._exc_info:
+            six.reraise(*self._exc_info)
+        return self._result
+
+
+def prefetch_map(func, args):
+    """Like map(), but computes the next item in background while yielding.
+
+    At most one call of |func| is in progress at any time.
+    """
+    pending = None
+    for arg in args:
+        if pending is None:
+            pending = _BackgroundCall(func, arg)
+            continue
+        result = pending.result()
+        pending = _BackgroundCall(func, arg)
+        yield result
+    if pending is not None:
+        yield pending.result()
+
+
+class CellCache(object):
+    """Stores known cell values of a worksheet, indexed by row and column.
+
+    Unknown cells are None.
+    """
+
+    def __init__(self):
+        self._rows = {}  # row -> [value]
+
+    def clear(self):
+        self._rows.clear()
+
+    def get(self, row, col):
+        row_values = self._rows.get(row)
+        if row_values is None or col >= len(row_values):
+            return None
+        return row_values[col]
+
+    def get_row(self, row, start_col, end_col):
+        """Returns values of a row, or None if any of them is unknown."""
+        row_values = self._rows.get(row)
+        if row_values is None or end_col > len(row_values):
+            return None
+        row_values = row_values[start_col:end_col]
+        if None in row_values:
+            return None
+        return row_values
+
+    def is_filled(self, start_row, end_row, start_col, end_col):
+        return all(
+            self.get_row(row, start_col, end_col) is not None
+            for row in py3.range(start_row, end_row))
+
+    def store(self, start_row, start_col, values):
+        for row, block_row in enumerate(values, start_row):
+            end_col = start_col + len(block_row)
+            self._get_row_for_update(row, end_col)[start_col:end_col] = (
+                block_row)
+
+    def invalidate(self, start_row, end_row, start_col, end_col):
+        for row in py3.range(start_row, end_row):
+            row_values = self._rows.get(row)
+            if row_values is None:
+                continue
+            end = min(end_col, len(row_values))
+            if start_col < end:
+                row_values[start_col:end] = [None] * (end - start_col)
+
+    def _get_row_for_update(self, row, end_col):
+        row_values = self._rows.setdefault(row, [])
+        if len(row_values) < end_col:
+            row_values.extend([None] * (end_col - len(row_values)))
+        return row_values
+
+
 class LazyOrderedDictionary(object):
 
+    __slots__ = (
+        '_enumerator', '_constructor', '_cache_list', '_cache_index',
+        '_enumerated', '_enumeration', '_enumerated_list',
+        '_enumerated_index')
+
     def __init__(self, enumerator, constructor):
         self._enumerator = enumerator
         self._constructor = constructor
         self._cache_list = []   # [(key, value)]
         self._cache_index = {}  # key -> index of _cache_list
         self._enumerated = False
+        # While the enumerator is partially consumed, entries enumerated so
+        # far are kept separately from constructed entries in _cache_list.
+        self._enumeration = None
+        self._enumerated_list = []   # [(key, value)]
+        self._enumerated_index = {}  # key -> index of _enumerated_list
 
     def refresh(self):
         del self._cache_list[:]
         self._cache_index.clear()
         self._enumerated = False
+        self._enumeration = None
+        del self._enumerated_list[:]
+        self._enumerated_index.clear()
 
     def __len__(self):
         self._ensure_enumerated()
@@ -92,8 +253,7 @@ class LazyOrderedDictionary(object):
         return self.iterkeys()
 
     def iterkeys(self):
-        self._ensure_enumerated()
-        for key, _ in self._cache_list:
+        for key, _ in self.iteritems():
             yield key
 
     def itervalues(self):
@@ -101,8 +261,16 @@ class LazyOrderedDictionary(object):
             yield value
 
     def iteritems(self):
-        self._ensure_enumerated()
-        for key, value in self._cache_list:
+        # Entries are yielded as the enumerator produces them, so that
+        # stopping early does not consume the rest of the enumerator.
+        index = 0
+        while not self._enumerated:
+            if index < len(self._enumerated_list):
+                yield self._enumerated_list[index]
+                index += 1
+            else:
+                self._enumerate_next()
+        for key, value in self._cache_list[index:]:
             yield (key, value)
 
     def keys(self):
@@ -121,6 +289,9 @@ class LazyOrderedDictionary(object):
         index = self._cache_index.get(key)
         if index is not None:
             return self._cache_list[index][1]
+        index = self._enumerated_index.get(key)
+        if index is not None:
+            return self._enumerated_list[index][1]
         if self._constructor:
             value = self._constructor(key)
             if value is None:
@@ -129,11 +300,14 @@ class LazyOrderedDictionary(object):
             self._cache_index[key] = index
             self._cache_list.append((key, value))
             return value
-        self._ensure_enumerated()
-        index = self._cache_index.get(key)
-        if index is None:
-            raise KeyError(key)
-        return self._cache_list[index][1]
+        while not (self._enumerated or key in self._enumerated_index):
+            self._enumerate_next()
+        if self._enumerated:
+            index = self._cache_index.get(key)
+            if index is None:
+                raise KeyError(key)
+            return self._cache_list[index][1]
+        return self._enumerated_list[self._enumerated_index[key]][1]
 
     def get(self, key, default=None):
         try:
@@ -142,23 +316,38 @@ class LazyOrderedDictionary(object):
             return default
 
     def _ensure_enumerated(self):
-        if self._enumerated:
+        while not self._enumerated:
+            self._enumerate_next()
+
+    def _enumerate_next(self):
+        if self._enumeration is None:
+            self._enumeration = iter(self._enumerator())
+        try:
+            key, value = py3.next(self._enumeration)
+        except StopIteration:
+            self._finish_enumeration()
             return
-        # Save partially constructed entries.
+        # Partially constructed entries take precedence.
+        index = self._cache_index.get(key)
+        if index is not None:
+            value = self._cache_list[index][1]
+        self._enumerated_index[key] = len(self._enumerated_list)
+        self._enumerated_list.append((key, value))
+
+    def _finish_enumeration(self):
+        # Constructed entries not listed by the enumerator follow enumerated
+        # ones.
         saves = self._cache_list[:]
-        # Initialize cache with the enumerator.
-        del self._cache_list[:]
+        self._cache_list[:] = self._enumerated_list
         self._cache_index.clear()
-        for key, value in self._enumerator():
-            self._cache_index[key] = len(self._cache_list)
-            self._cache_list.append((key, value))
-        # Restore saved entries.
+        self._cache_index.update(self._enumerated_index)
         for key, value in saves:
-            index = self._cache_index.get(key)
-            if index is None:
-                index = len(self._cache_list)
-                self._cache_list.append((None, None))
-            self._cache_list[index] = (key, value)
+            if key not in self._cache_index:
+                self._cache_index[key] = len(self._cache_list)
+                self._cache_list.append((key, value))
+        self._enumeration = None
+        self._enumerated_list = []
+        self._enumerated_index = {}
         self._enumerated = True
 
 
@@ -172,6 +361,8 @@ class CustomMutableFixedList(object):
     - __len__
     """
 
+    __slots__ = ()
+
     def __bool__(self):
         return len(self) > 0
 
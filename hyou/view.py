@@ -15,76 +15,591 @@
 from __future__ import (
     absolute_import, division, print_function, unicode_literals)
 
+import collections
+import math
+
 import six
 
+from . import exception
 from . import py3
 from . import util
 
 
+def fetch_all(*views):
+    """Fetches cells of views with one request per spreadsheet."""
+    # Views with different render options need separate requests.
+    bands_by_key = collections.OrderedDict()
+    for aview in views:
+        spreadsheet = aview._worksheet._spreadsheet
+        _, bands = bands_by_key.setdefault(
+            (spreadsheet.key, aview._render_options), (spreadsheet, []))
+        for start_row, end_row in aview._unfetched_bands():
+            bands.append((aview, start_row, end_row))
+    for (_, render_options), (spreadsheet, bands) in bands_by_key.items():
+        if not bands:
+            continue
+        value_ranges = spreadsheet._batch_get_values(
+            [
+                util.format_range_a1_notation(
+                    aview._worksheet.title, start_row, end_row,
+                    aview._start_col, aview._end_col)
+                for aview, start_row, end_row in bands
+            ],
+            render_options)
+        for (aview, start_row, end_row), values in py3.zip(
+                bands, value_ranges):
+            aview._store_fetched_values(start_row, end_row, values)
+
+
+def _to_cell_value(value, typed=False):
+    # In typed mode, numbers and booleans are sent as JSON values.
+    if typed and isinstance(value, (bool,) + six.integer_types):
+        return value
+    if (typed and isinstance(value, float) and
+            not (math.isinf(value) or math.isnan(value))):
+        return value
+    if value is None:
+        value = ''
+    elif isinstance(value, six.integer_types):
+        value = '%d' % value
+    elif isinstance(value, float):
+        # Do best not to lose precision...
+        value = '%.20e' % value
+    elif isinstance(value, py3.bytes):
+        # May raise UnicodeDecodeError.
+        value = value.decode('ascii')
+    elif not isinstance(value, py3.str):
+        value = py3.str(value)
+    assert isinstance(value, py3.str)
+    return value
+
+
+def _numpy_to_cell_values(array, typed=False):
+    import numpy
+    if typed and array.dtype.kind in 'biu':
+        values = array.astype(object)
+    elif typed and array.dtype.kind == 'f':
+        values = array.astype(object)
+        not_finite = ~numpy.isfinite(array)
+        values[not_finite] = array[not_finite].astype(py3.str)
+        values[numpy.isnan(array)] = ''
+    elif array.dtype.kind == 'b':
+        values = array.astype(int).astype(py3.str)
+    elif array.dtype.kind in 'iu':
+        values = array.astype(py3.str)
+    elif array.dtype.kind == 'f':
+        values = array.astype(py3.str)
+        values[numpy.isnan(array)] = ''
+    elif array.size:
+        values = numpy.vectorize(
+            lambda value: _to_cell_value(value, typed), otypes=[object])(array)
+    else:
+        values = array.astype(py3.str)
+    return values
+
+
 class View(util.CustomMutableFixedList):
 
-    def __init__(self, worksheet, api, start_row, end_row, start_col, end_col):
+    __slots__ = (
+        '_worksheet', '_api', '_start_row', '_end_row', '_start_col',
+        '_end_col', '_fetch_rows', '_render_options', '_value_input_option',
+        '_typed_writes', '_cache', '_queued_updates', '_pending_values',
+        '_skip_unchanged', '_original_values', '_write_batch')
+
+    def __init__(self, worksheet, api, start_row, end_row, start_col, end_col,
+                 fetch_rows=None, skip_unchanged=False,
+                 value_render_option='FORMATTED_VALUE',
+                 date_time_render_option='FORMATTED_STRING',
+                 value_input_option='USER_ENTERED'):
+        if fetch_rows is not None:
+            util.check_type(fetch_rows, six.integer_types)
+            if fetch_rows <= 0:
+                raise ValueError('fetch_rows must be positive')
         self._worksheet = worksheet
         self._api = api
         self._start_row = start_row
         self._end_row = end_row
         self._start_col = start_col
         self._end_col = end_col
-        self._view_rows = [
-            ViewRow(self, row, start_col, end_col)
-            for row in py3.range(start_row, end_row)]
-        self._input_value_map = {}
-        self._cells_fetched = False
+        # Cells are fetched in bands of |fetch_rows| rows. By default the whole
+        # view is a single band.
+        self._fetch_rows = fetch_rows or max(end_row - start_row, 1)
+        self._render_options = (value_render_option, date_time_render_option)
+        # With RAW input, values are not parsed by the server, so numbers and
+        # booleans are sent as JSON values to keep their types.
+        self._value_input_option = value_input_option
+        self._typed_writes = value_input_option == 'RAW'
+        # Cell values are cached in the worksheet and shared by its views with
+        # the same render options. Values written to the view are kept in
+        # |_pending_values| on top of the cache, so that other views never see
+        # them. Once they are sent, the cells are invalidated in the cache.
+        self._cache = worksheet._get_cell_cache(self._render_options)
         self._queued_updates = []
+        self._pending_values = {}  # (row, col) -> value
+        # With |skip_unchanged|, cells are fetched before being written and
+        # writes equal to the current value are not queued. Fetched values of
+        # overwritten cells are kept so that cells written back to their
+        # original value are not sent. Fetched values are converted like
+        # written values before comparison, so numbers are only recognized as
+        # unchanged when fetched with UNFORMATTED_VALUE; with other render
+        # options they are compared with their formatted strings.
+        self._skip_unchanged = skip_unchanged
+        self._original_values = {}
+        # The list of views in Spreadsheet.write_batch() this view belongs to.
+        self._write_batch = worksheet._spreadsheet._write_batch_views
+        if self._write_batch is not None:
+            self._write_batch.append(self)
 
     def refresh(self):
-        self._input_value_map.clear()
-        self._cells_fetched = False
+        """Discards cached values of the view's cells and queued updates."""
+        self._cache.invalidate(
+            self._start_row, self._end_row, self._start_col, self._end_col)
+        self._discard_queued_updates()
+
+    def clear(self):
+        """Clears all cells in the view and discards queued updates."""
+        self._worksheet._spreadsheet.clear_ranges([self])
+
+    def _set_cleared(self):
+        self._worksheet._store_cell_values(
+            self._start_row, self._start_col,
+            [[''] * self.cols for _ in py3.range(self.rows)])
+        self._discard_queued_updates()
+
+    def _clear_queued_updates(self):
         del self._queued_updates[:]
+        self._pending_values.clear()
+        self._original_values.clear()
+
+    def _discard_queued_updates(self):
+        """Discards queued updates of cells in the view's range.
+
+        Updates queued through a parent or sibling view for cells outside the
+        range are kept.
+        """
+        def in_range(row, col):
+            return (self._start_row <= row < self._end_row and
+                    self._start_col <= col < self._end_col)
+        queued_updates = []
+        for row, col, values in self._queued_updates:
+            end_row = row + len(values)
+            end_col = col + len(values[0])
+            if (row >= self._end_row or end_row <= self._start_row or
+                    col >= self._end_col or end_col <= self._start_col):
+                queued_updates.append((row, col, values))
+                continue
+            for index_row, block_row in enumerate(values, row):
+                for index_col, value in enumerate(block_row, col):
+                    if not in_range(index_row, index_col):
+                        queued_updates.append(
+                            (index_row, index_col, [[value]]))
+        self._queued_updates[:] = queued_updates
+        for cells in (self._pending_values, self._original_values):
+            for key in [key for key in cells if in_range(*key)]:
+                del cells[key]
+
+    def _set_committed(self, rects):
+        # Sent values are input values, e.g. formulas, which may be rendered
+        # differently by the server, so the cells are fetched again.
+        for start_row, end_row, start_col, end_col, _ in rects:
+            self._worksheet._invalidate_cells(
+                start_row, end_row, start_col, end_col)
+        self._clear_queued_updates()
+
+    def _ensure_cells_fetched(self, row):
+        if self._cache.get_row(
+                row, self._start_col, self._end_col) is not None:
+            return
+        band = (row - self._start_row) // self._fetch_rows
+        start_row = self._start_row + band * self._fetch_rows
+        end_row = min(start_row + self._fetch_rows, self._end_row)
+        values = self._worksheet._get_values(
+            start_row, end_row, self._start_col, self._end_col,
+            self._render_options)
+        self._store_fetched_values(start_row, end_row, values)
+
+    def _unfetched_bands(self):
+        for start_row in py3.range(
+                self._start_row, self._end_row, self._fetch_rows):
+            end_row = min(start_row + self._fetch_rows, self._end_row)
+            if not self._cache.is_filled(
+                    start_row, end_row, self._start_col, self._end_col):
+                yield (start_row, end_row)
+
+    def _store_fetched_values(self, start_row, end_row, values):
+        cols = self.cols
+        values.extend([] for _ in py3.range(end_row - start_row - len(values)))
+        for row_values in values:
+            row_values.extend([''] * (cols - len(row_values)))
+        self._cache.store(start_row, self._start_col, values)
+
+    def _get_value(self, row, col):
+        value = self._pending_values.get((row, col))
+        if value is not None:
+            return value
+        value = self._cache.get(row, col)
+        if value is None:
+            self._ensure_cells_fetched(row)
+            value = self._cache.get(row, col)
+        return value
+
+    def _set_value(self, row, col, value):
+        if self._skip_unchanged:
+            current_value = _to_cell_value(
+                self._get_value(row, col), self._typed_writes)
+            if current_value == value:
+                return
+            self._original_values.setdefault((row, col), current_value)
+        self._pending_values[(row, col)] = value
+        self._queued_updates.append((row, col, [[value]]))
+
+    def _set_block(self, row, col, values):
+        """Writes a rectangle of converted values at (row, col)."""
+        if not values or not values[0]:
+            return
+        if self._skip_unchanged:
+            for index_row, block_row in enumerate(values, row):
+                for index_col, value in enumerate(block_row, col):
+                    self._set_value(index_row, index_col, value)
+            return
+        for index_row, block_row in enumerate(values, row):
+            for index_col, value in enumerate(block_row, col):
+                self._pending_values[(index_row, index_col)] = value
+        self._queued_updates.append((row, col, values))
 
-    def _ensure_cells_fetched(self):
-        if self._cells_fetched:
+    def _store_values(self, row, col, values):
+        self._worksheet._store_cell_values(
+            row, col, values, self._render_options)
+
+    def _ensure_all_cells_fetched(self):
+        for start_row, _ in list(self._unfetched_bands()):
+            self._ensure_cells_fetched(start_row)
+
+    def _get_row_values(self, row, start_col, end_col):
+        self._ensure_cells_fetched(row)
+        row_values = self._cache.get_row(row, start_col, end_col)
+        if self._pending_values:
+            for index, col in enumerate(py3.range(start_col, end_col)):
+                value = self._pending_values.get((row, col))
+                if value is not None:
+                    row_values[index] = value
+        return row_values
+
+    def _get_all_values(self):
+        self._ensure_all_cells_fetched()
+        return [
+            self._get_row_values(row, self._start_col, self._end_col)
+            for row in py3.range(self._start_row, self._end_row)]
+
+    def commit(self, include_values=False):
+        """Sends queued updates.
+
+        If |include_values| is true, values of updated cells are read back in
+        the same request with the view's render options and stored in the
+        view, e.g. to see results of formulas without fetching again.
+        """
+        # Inside Spreadsheet.write_batch(), updates are sent on exit.
+        if self._write_batch is not None:
+            return
+        rects = self._make_update_rects()
+        if not rects:
             return
-        range_str = util.format_range_a1_notation(
-            self._worksheet.title, self._start_row, self._end_row,
-            self._start_col, self._end_col)
-        response = self._api.sheets.spreadsheets().values().get(
-            spreadsheetId=self._worksheet._spreadsheet.key,
-            range=py3.str_to_native_str(range_str, encoding='utf-8'),
-            majorDimension='ROWS',
-            valueRenderOption='FORMATTED_VALUE',
-            dateTimeRenderOption='FORMATTED_STRING').execute()
-        self._input_value_map = {}
-        for i, row in enumerate(response.get('values', [])):
-            index_row = self._start_row + i
-            for j, value in enumerate(row):
-                index_col = self._start_col + j
-                self._input_value_map.setdefault((index_row, index_col), value)
-        self._cells_fetched = True
-
-    def commit(self):
+        response = self._worksheet._spreadsheet._batch_update_values(
+            self._make_update_data(rects), self._value_input_option,
+            response_render_options=(
+                self._render_options if include_values else None))
+        self._set_committed(rects)
+        if include_values:
+            for (start_row, end_row, start_col, end_col, _), update in (
+                    py3.zip(rects, response['responses'])):
+                values = update['updatedData'].get('values', [])
+                values.extend(
+                    [] for _ in py3.range(end_row - start_row - len(values)))
+                for row_values in values:
+                    row_values.extend(
+                        [''] * (end_col - start_col - len(row_values)))
+                self._store_values(start_row, start_col, values)
+
+    def _make_update_rects(self):
         if not self._queued_updates:
+            return []
+        if len(self._queued_updates) == 1 and not self._original_values:
+            row, col, values = self._queued_updates[0]
+            return [(row, row + len(values), col, col + len(values[0]),
+                     values)]
+        # Later writes to the same cell win.
+        cells = {}
+        for row, col, values in self._queued_updates:
+            for index_row, block_row in enumerate(values, row):
+                for index_col, value in enumerate(block_row, col):
+                    cells[(index_row, index_col)] = value
+        for key, value in self._original_values.items():
+            if cells.get(key) == value:
+                del cells[key]
+        return util.coalesce_cells(cells)
+
+    def _make_update_data(self, rects=None):
+        if rects is None:
+            rects = self._make_update_rects()
+        return [
+            {
+                'range': util.format_range_a1_notation(
+                    self._worksheet.title,
+                    start_row, end_row, start_col, end_col),
+                'majorDimension': 'ROWS',
+                'values': values,
+            }
+            for start_row, end_row, start_col, end_col, values in rects
+        ]
+
+    def sort(self, key=None, reverse=False, by_columns=None, ascending=True):
+        """Sorts rows of the view.
+
+        If |key| is given, rows are sorted locally like list.sort() and written
+        back as queued updates. Otherwise they are sorted on the server with a
+        sortRange request: |by_columns| lists column offsets in the view to
+        sort by, all columns by default, and |ascending| is a bool or a list of
+        bools for each column. |reverse| reverses the sort orders.
+        """
+        if key is not None:
+            if by_columns is not None:
+                raise ValueError('key and by_columns are mutually exclusive')
+            self[:] = sorted(
+                [list(row) for row in self], key=key, reverse=reverse)
             return
-        request = {
-            'data': [
+        if by_columns is None:
+            by_columns = list(py3.range(self.cols))
+        else:
+            by_columns = list(by_columns)
+            if not by_columns:
+                raise ValueError('by_columns must not be empty')
+        if isinstance(ascending, bool):
+            ascending = [ascending] * len(by_columns)
+        ascending = list(ascending)
+        if len(ascending) != len(by_columns):
+            raise ValueError(
+                'Got %d sort orders for %d columns' %
+                (len(ascending), len(by_columns)))
+        if reverse:
+            ascending = [not asc for asc in ascending]
+        for col in by_columns:
+            util.check_type(col, six.integer_types)
+            if not (0 <= col < self.cols):
+                raise IndexError('Column %d is out of range.' % col)
+        self._run_range_request('sortRange', {
+            'range': self._make_grid_range(),
+            'sortSpecs': [
                 {
-                    'range': util.format_range_a1_notation(
-                        self._worksheet.title, row, row + 1, col, col + 1),
-                    'majorDimension': 'ROWS',
-                    'values': [[value]],
+                    'dimensionIndex': self._start_col + col,
+                    'sortOrder': 'ASCENDING' if asc else 'DESCENDING',
                 }
-                for row, col, value in self._queued_updates
+                for col, asc in py3.zip(by_columns, ascending)
             ],
-            'valueInputOption': 'USER_ENTERED',
-            'includeValuesInResponse': False,
+        })
+
+    def find_replace(self, find, replacement, match_case=False,
+                     match_entire_cell=False, search_by_regex=False,
+                     include_formulas=False):
+        """Replaces |find| with |replacement| in the view on the server.
+
+        Returns the number of occurrences changed.
+        """
+        reply = self._run_range_request('findReplace', {
+            'find': find,
+            'replacement': replacement,
+            'matchCase': match_case,
+            'matchEntireCell': match_entire_cell,
+            'searchByRegex': search_by_regex,
+            'includeFormulas': include_formulas,
+            'range': self._make_grid_range(),
+        })
+        return reply.get('occurrencesChanged', 0)
+
+    def dedupe(self, columns=None):
+        """Deletes rows duplicating an earlier row on the server.
+
+        Rows are compared by |columns|, a list of column offsets in the view,
+        or all columns by default. Rows below the removed ones within the view
+        are shifted up. Returns the number of removed rows.
+        """
+        if columns is None:
+            columns = py3.range(self.cols)
+        comparison_columns = []
+        for col in columns:
+            util.check_type(col, six.integer_types)
+            if not (0 <= col < self.cols):
+                raise IndexError('Column %d is out of range.' % col)
+            comparison_columns.append({
+                'sheetId': self._worksheet.key,
+                'dimension': 'COLUMNS',
+                'startIndex': self._start_col + col,
+                'endIndex': self._start_col + col + 1,
+            })
+        reply = self._run_range_request('deleteDuplicates', {
+            'range': self._make_grid_range(),
+            'comparisonColumns': comparison_columns,
+        })
+        return reply.get('duplicatesRemovedCount', 0)
+
+    def trim_whitespace(self):
+        """Trims whitespace of cells in the view on the server.
+
+        Returns the number of changed cells.
+        """
+        reply = self._run_range_request('trimWhitespace', {
+            'range': self._make_grid_range(),
+        })
+        return reply.get('cellsChangedCount', 0)
+
+    def _run_range_request(self, method, params):
+        """Sends a batchUpdate request operating on cells of the view.
+
+        Queued updates are committed first, and cached cells of the view are
+        discarded. Returns the reply to the request.
+        """
+        # Deferred writes would be sent after the request.
+        if self._write_batch is not None:
+            raise exception.HyouRuntimeError(
+                '%s is not allowed in Spreadsheet.write_batch()' % method)
+        if not (self.rows and self.cols):
+            return {}
+        self.commit()
+        response = self._worksheet._spreadsheet._batch_update(
+            [{method: params}])
+        self._worksheet._invalidate_cells(
+            self._start_row, self._end_row, self._start_col, self._end_col)
+        return response['replies'][0].get(method, {})
+
+    def _make_grid_range(self):
+        return {
+            'sheetId': self._worksheet.key,
+            'startRowIndex': self._start_row,
+            'endRowIndex': self._end_row,
+            'startColumnIndex': self._start_col,
+            'endColumnIndex': self._end_col,
         }
-        self._api.sheets.spreadsheets().values().batchUpdate(
-            spreadsheetId=self._worksheet._spreadsheet.key,
-            body=request).execute()
-        del self._queued_updates[:]
+
+    def to_numpy(self, dtype=None):
+        """Returns cell values as a 2-D numpy array.
+
+        Values are converted to |dtype| (float by default). For floating point
+        types, empty cells become NaN.
+        """
+        import numpy
+        dtype = numpy.dtype(float if dtype is None else dtype)
+        array = numpy.array(self._get_all_values(), dtype=object).reshape(
+            (self.rows, self.cols))
+        if dtype.kind in 'fc':
+            array[array == ''] = numpy.nan
+        return array.astype(dtype)
+
+    def assign_numpy(self, array, row=0, col=0):
+        """Writes a 2-D numpy array at the given offset of the view.
+
+        NaNs are written as empty cells.
+        """
+        import numpy
+        array = numpy.asarray(array)
+        if array.ndim != 2:
+            raise ValueError('Expected a 2-D array, got %d-D' % array.ndim)
+        self._check_block(array.shape[0], array.shape[1], row, col)
+        self._set_block(
+            self._start_row + row, self._start_col + col,
+            _numpy_to_cell_values(array, self._typed_writes).tolist())
+
+    def assign(self, values, row=0, col=0):
+        """Writes a 2-D sequence of values at the given offset of the view.
+
+        The block is converted and validated at once and queued as a single
+        rectangular update.
+        """
+        values = self._convert_block(values)
+        self._check_block(
+            len(values), len(values[0]) if values else 0, row, col)
+        self._set_block(self._start_row + row, self._start_col + col, values)
+
+    def _convert_block(self, values):
+        typed = self._typed_writes
+        block = [
+            [value if type(value) is py3.str else _to_cell_value(value, typed)
+             for value in block_row]
+            for block_row in values]
+        if block and any(len(block_row) != len(block[0])
+                         for block_row in block):
+            raise ValueError('All rows must have the same length')
+        return block
+
+    def to_dataframe(self, header=True):
+        """Returns cell values as a pandas DataFrame of strings.
+
+        If |header| is true, the first row of the view is used as column names.
+        """
+        import pandas
+        rows = self._get_all_values()
+        columns = None
+        if header and rows:
+            columns, rows = rows[0], rows[1:]
+        if not rows:
+            return pandas.DataFrame(columns=columns)
+        data_frame = pandas.DataFrame(
+            dict(enumerate(list(column) for column in py3.zip(*rows))))
+        if columns is not None:
+            data_frame.columns = columns
+        return data_frame
+
+    def _make_sub_view(self, row_slice, col_slice):
+        """Returns a view of a sub-rectangle sharing queued updates.
+
+        Cached cells are shared through the worksheet. Updates queued in either
+        view are sent by committing any of them, and refreshing or clearing a
+        view discards queued updates in its range only.
+        """
+        util.check_type(row_slice, slice)
+        util.check_type(col_slice, slice)
+        start_row, end_row, row_step = row_slice.indices(self.rows)
+        start_col, end_col, col_step = col_slice.indices(self.cols)
+        if row_step != 1 or col_step != 1:
+            raise NotImplementedError('slicing with step is not supported')
+        value_render_option, date_time_render_option = self._render_options
+        sub_view = View(
+            self._worksheet, self._api,
+            self._start_row + start_row,
+            self._start_row + max(start_row, end_row),
+            self._start_col + start_col,
+            self._start_col + max(start_col, end_col),
+            fetch_rows=self._fetch_rows,
+            skip_unchanged=self._skip_unchanged,
+            value_render_option=value_render_option,
+            date_time_render_option=date_time_render_option,
+            value_input_option=self._value_input_option)
+        sub_view._queued_updates = self._queued_updates
+        sub_view._pending_values = self._pending_values
+        sub_view._original_values = self._original_values
+        return sub_view
+
+    def _check_block(self, rows, cols, row, col):
+        util.check_type(row, six.integer_types)
+        util.check_type(col, six.integer_types)
+        if not (0 <= row and row + rows <= self.rows and
+                0 <= col and col + cols <= self.cols):
+            raise ValueError(
+                'Tried to assign %dx%d values at (%d, %d) of %dx%d view' %
+                (rows, cols, row, col, self.rows, self.cols))
 
     def __getitem__(self, index):
-        return self._view_rows[index]
+        if isinstance(index, tuple):
+            return self._make_sub_view(*index)
+        # ViewRows are created on demand to keep views cheap to create.
+        if isinstance(index, slice):
+            return [self[i] for i in py3.range(*index.indices(len(self)))]
+        util.check_type(index, six.integer_types)
+        if index < 0:
+            row = self._end_row + index
+        else:
+            row = self._start_row + index
+        if not (self._start_row <= row < self._end_row):
+            raise IndexError('Row %d is out of range.' % row)
+        return ViewRow(self, row, self._start_col, self._end_col)
 
     def __setitem__(self, index, new_value):
         if isinstance(index, slice):
@@ -93,23 +608,28 @@ class View(util.CustomMutableFixedList):
                 raise NotImplementedError('slicing with step is not supported')
             if stop < start:
                 stop = start
-            if len(new_value) != stop - start:
+            values = self._convert_block(new_value)
+            if len(values) != stop - start:
+                raise ValueError(
+                    'Tried to assign %d values to %d element slice' %
+                    (len(values), stop - start))
+            if values and len(values[0]) != self.cols:
                 raise ValueError(
                     'Tried to assign %d values to %d element slice' %
-                    (len(new_value), stop - start))
-            for i, new_value_one in py3.zip(py3.range(start, stop), new_value):
-                self[i] = new_value_one
+                    (len(values[0]), self.cols))
+            self._set_block(self._start_row + start, self._start_col, values)
             return
-        self._view_rows[index][:] = new_value
+        self[index][:] = new_value
 
     def __len__(self):
         return self.rows
 
     def __iter__(self):
-        return iter(self._view_rows)
+        for row in py3.range(self._start_row, self._end_row):
+            yield ViewRow(self, row, self._start_col, self._end_col)
 
     def __repr__(self):
-        return str('View(%r)') % (self._view_rows,)
+        return str('View(%r)') % (list(self),)
 
     @property
     def rows(self):
@@ -138,6 +658,8 @@ class View(util.CustomMutableFixedList):
 
 class ViewRow(util.CustomMutableFixedList):
 
+    __slots__ = ('_view', '_row', '_start_col', '_end_col')
+
     def __init__(self, view, row, start_col, end_col):
         self._view = view
         self._row = row
@@ -161,9 +683,7 @@ class ViewRow(util.CustomMutableFixedList):
             col = self._start_col + index
         if not (self._start_col <= col < self._end_col):
             raise IndexError('Column %d is out of range.' % col)
-        if (self._row, col) not in self._view._input_value_map:
-            self._view._ensure_cells_fetched()
-        return self._view._input_value_map.get((self._row, col), '')
+        return self._view._get_value(self._row, col)
 
     def __setitem__(self, index, new_value):
         if isinstance(index, slice):
@@ -172,12 +692,16 @@ class ViewRow(util.CustomMutableFixedList):
                 raise NotImplementedError('slicing with step is not supported')
             if stop < start:
                 stop = start
-            if len(new_value) != stop - start:
+            typed = self._view._typed_writes
+            values = [
+                value if type(value) is py3.str
+                else _to_cell_value(value, typed)
+                for value in new_value]
+            if len(values) != stop - start:
                 raise ValueError(
                     'Tried to assign %d values to %d element slice' %
-                    (len(new_value), stop - start))
-            for i, new_value_one in py3.zip(py3.range(start, stop), new_value):
-                self[i] = new_value_one
+                    (len(values), stop - start))
+            self._view._set_block(self._row, self._start_col + start, [values])
             return
         util.check_type(index, six.integer_types)
         if index < 0:
@@ -186,29 +710,15 @@ class ViewRow(util.CustomMutableFixedList):
             col = self._start_col + index
         if not (self._start_col <= col < self._end_col):
             raise IndexError('Column %d is out of range.' % col)
-        if new_value is None:
-            new_value = ''
-        elif isinstance(new_value, six.integer_types):
-            new_value = '%d' % new_value
-        elif isinstance(new_value, float):
-            # Do best not to lose precision...
-            new_value = '%.20e' % new_value
-        elif isinstance(new_value, py3.bytes):
-            # May raise UnicodeDecodeError.
-            new_value = new_value.decode('ascii')
-        elif not isinstance(new_value, py3.str):
-            new_value = py3.str(new_value)
-        assert isinstance(new_value, py3.str)
-        self._view._input_value_map[(self._row, col)] = new_value
-        self._view._queued_updates.append((self._row, col, new_value))
+        new_value = _to_cell_value(new_value, self._view._typed_writes)
+        self._view._set_value(self._row, col, new_value)
 
     def __len__(self):
         return self._end_col - self._start_col
 
     def __iter__(self):
-        self._view._ensure_cells_fetched()
-        for col in py3.range(self._start_col, self._end_col):
-            yield self._view._input_value_map.get((self._row, col), '')
+        return iter(self._view._get_row_values(
+            self._row, self._start_col, self._end_col))
 
     def __repr__(self):
         return repr(list(self))
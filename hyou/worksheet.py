@@ -15,19 +15,32 @@
 from __future__ import (
     absolute_import, division, print_function, unicode_literals)
 
+import time
+
 import six
 
 from . import exception
+from . import py3
 from . import util
 from . import view
 
 
 class Worksheet(object):
 
+    __slots__ = (
+        '_spreadsheet', '_api', '_entry', '_cell_caches', '_append_buffer',
+        '_append_buffered_at', '_append_value_input_option')
+
     def __init__(self, spreadsheet, api, entry):
         self._spreadsheet = spreadsheet
         self._api = api
         self._entry = entry
+        # Cell values shared by views, keyed by (value_render_option,
+        # date_time_render_option).
+        self._cell_caches = {}
+        self._append_buffer = []
+        self._append_buffered_at = None
+        self._append_value_input_option = None
 
     def __repr__(self):
         return str('Worksheet(key=%r)') % (self.key,)
@@ -36,17 +49,14 @@ class Worksheet(object):
         if entry is not None:
             self._entry = entry
         else:
-            spreadsheet_entry = self._api.sheets.spreadsheets().get(
-                spreadsheetId=self._spreadsheet.key,
-                includeGridData=False).execute()
-            for entry in spreadsheet_entry['sheets']:
-                if entry['properties']['sheetId'] == self.key:
-                    self._entry = entry
-                    break
-            else:
-                raise exception.HyouRuntimeError('The sheet has been removed.')
+            self._invalidate_cell_caches()
+            self._spreadsheet._refresh_worksheet(self)
 
-    def view(self, start_row=None, end_row=None, start_col=None, end_col=None):
+    def view(self, start_row=None, end_row=None, start_col=None, end_col=None,
+             fetch_rows=None, skip_unchanged=False,
+             value_render_option='FORMATTED_VALUE',
+             date_time_render_option='FORMATTED_STRING',
+             value_input_option='USER_ENTERED'):
         start_row, end_row, _ = slice(start_row, end_row).indices(self.rows)
         start_col, end_col, _ = slice(start_col, end_col).indices(self.cols)
         if start_row > end_row:
@@ -56,45 +66,162 @@ class Worksheet(object):
         return view.View(
             self, self._api,
             start_row=start_row, end_row=end_row,
-            start_col=start_col, end_col=end_col)
+            start_col=start_col, end_col=end_col,
+            fetch_rows=fetch_rows, skip_unchanged=skip_unchanged,
+            value_render_option=value_render_option,
+            date_time_render_option=date_time_render_option,
+            value_input_option=value_input_option)
+
+    def iter_rows(self, chunk_rows=1000, prefetch=False,
+                  value_render_option='FORMATTED_VALUE',
+                  date_time_render_option='FORMATTED_STRING'):
+        """Iterates over rows of the worksheet as lists of cell values.
+
+        Rows are fetched |chunk_rows| at a time and are not cached. With
+        |prefetch|, the next chunk is fetched in a background thread while the
+        caller processes the current one. The background thread shares the
+        HTTP client of the collection, which is not thread-safe, so no other
+        calls may be made through the same collection until the iteration is
+        finished, including from the loop body.
+        """
+        util.check_type(chunk_rows, six.integer_types)
+        if chunk_rows <= 0:
+            raise ValueError('chunk_rows must be positive')
+        rows, cols = self.rows, self.cols
+        render_options = (value_render_option, date_time_render_option)
+        chunks = [
+            (start_row, min(start_row + chunk_rows, rows))
+            for start_row in py3.range(0, rows, chunk_rows)]
+
+        def fetch_chunk(chunk):
+            start_row, end_row = chunk
+            return self._get_values(
+                start_row, end_row, 0, cols, render_options)
+
+        if prefetch:
+            chunk_values = util.prefetch_map(fetch_chunk, chunks)
+        else:
+            chunk_values = py3.map(fetch_chunk, chunks)
+        for (start_row, end_row), values in py3.zip(chunks, chunk_values):
+            for i in py3.range(end_row - start_row):
+                row = values[i] if i < len(values) else []
+                yield row + [''] * (cols - len(row))
+
+    def write_dataframe(self, data_frame, start_row=0, start_col=0,
+                        header=True, value_input_option='USER_ENTERED'):
+        """Writes a pandas DataFrame to the worksheet and commits it.
+
+        Column names are written in the first row if |header| is true. The
+        index is not written.
+        """
+        typed = value_input_option == 'RAW'
+        columns = []
+        for j in py3.range(len(data_frame.columns)):
+            series = data_frame.iloc[:, j]
+            if series.dtype.kind == 'M':
+                series = series.astype(py3.str)
+            values = view._numpy_to_cell_values(series.values, typed)
+            values[series.isnull().values] = ''
+            if header:
+                column = [view._to_cell_value(data_frame.columns[j])]
+                column.extend(values.tolist())
+            else:
+                column = values.tolist()
+            columns.append(column)
+        rows = [list(row) for row in py3.zip(*columns)]
+        if not rows:
+            return
+        end_row = start_row + len(rows)
+        end_col = start_col + len(columns)
+        if not (0 <= start_row and end_row <= self.rows and
+                0 <= start_col and end_col <= self.cols):
+            raise ValueError(
+                'Tried to write %dx%d values at (%d, %d) of %dx%d worksheet' %
+                (len(rows), len(columns), start_row, start_col,
+                 self.rows, self.cols))
+        aview = self.view(
+            start_row, end_row, start_col, end_col,
+            value_input_option=value_input_option)
+        aview._set_block(start_row, start_col, rows)
+        aview.commit()
+
+    def append_rows(self, rows, batch_size=None, flush_interval=None,
+                    value_input_option='USER_ENTERED'):
+        """Appends rows after the table in the worksheet.
+
+        Rows are buffered and sent with values.append once |batch_size| rows
+        are buffered or the oldest buffered row is |flush_interval| seconds
+        old. If neither is given, rows are sent immediately. These conditions
+        are only checked when append_rows() is called; there is no timer, so
+        rows buffered by the last call stay unsent until
+        flush_appended_rows() is called.
+        """
+        if (self._append_buffer and
+                value_input_option != self._append_value_input_option):
+            self.flush_appended_rows()
+        typed = value_input_option == 'RAW'
+        for row in rows:
+            self._append_buffer.append(
+                [view._to_cell_value(value, typed) for value in row])
+        if not self._append_buffer:
+            return
+        if self._append_buffered_at is None:
+            self._append_buffered_at = time.time()
+        self._append_value_input_option = value_input_option
+        if ((batch_size is None and flush_interval is None) or
+                (batch_size is not None and
+                 len(self._append_buffer) >= batch_size) or
+                (flush_interval is not None and
+                 time.time() - self._append_buffered_at >= flush_interval)):
+            self.flush_appended_rows()
+
+    def flush_appended_rows(self):
+        if not self._append_buffer:
+            return
+        rows = self._append_buffer
+        range_str = util.format_range_a1_notation(
+            self.title, 0, 1, 0, max(max(len(row) for row in rows), 1))
+        self._api.sheets.spreadsheets().values().append(
+            spreadsheetId=self._spreadsheet.key,
+            range=py3.str_to_native_str(range_str, encoding='utf-8'),
+            valueInputOption=self._append_value_input_option,
+            insertDataOption='INSERT_ROWS',
+            body={'majorDimension': 'ROWS', 'values': rows}).execute()
+        self._append_buffer = []
+        self._append_buffered_at = None
+        # INSERT_ROWS adds a new grid row for each appended row.
+        self._entry['properties']['gridProperties']['rowCount'] += len(rows)
+        # Rows below the table may have been shifted.
+        self._invalidate_cell_caches()
 
     def set_size(self, rows, cols):
         util.check_type(rows, six.integer_types)
         util.check_type(cols, six.integer_types)
         if not (rows >= 0 and cols >= 0):
             raise ValueError('Non-positive size is not allowed')
-        new_entry = self._make_single_batch_request(
-            'updateSheetProperties',
+        self._update_properties(
             {
-                'properties': {
-                    'sheetId': self.key,
-                    'gridProperties': {
-                        'rowCount': rows,
-                        'columnCount': cols,
-                    },
+                'gridProperties': {
+                    'rowCount': rows,
+                    'columnCount': cols,
                 },
-                'fields': 'gridProperties(rowCount,columnCount)',
-            })
-        self.refresh(new_entry)
+            },
+            'gridProperties(rowCount,columnCount)')
+        self._invalidate_cell_caches()
 
     def set_frozen_size(self, rows, cols):
         util.check_type(rows, six.integer_types)
         util.check_type(cols, six.integer_types)
         if not (rows >= 0 and cols >= 0):
             raise ValueError('Non-positive size is not allowed')
-        new_entry = self._make_single_batch_request(
-            'updateSheetProperties',
+        self._update_properties(
             {
-                'properties': {
-                    'sheetId': self.key,
-                    'gridProperties': {
-                        'frozenRowCount': rows,
-                        'frozenColumnCount': cols,
-                    },
+                'gridProperties': {
+                    'frozenRowCount': rows,
+                    'frozenColumnCount': cols,
                 },
-                'fields': 'gridProperties(frozenRowCount,frozenColumnCount)',
-            })
-        self.refresh(new_entry)
+            },
+            'gridProperties(frozenRowCount,frozenColumnCount)')
 
     @property
     def key(self):
@@ -106,16 +233,7 @@ class Worksheet(object):
 
     @title.setter
     def title(self, new_title):
-        new_entry = self._make_single_batch_request(
-            'updateSheetProperties',
-            {
-                'properties': {
-                    'sheetId': self.key,
-                    'title': new_title,
-                },
-                'fields': 'title',
-            })
-        self.refresh(new_entry)
+        self._update_properties({'title': new_title}, 'title')
 
     @property
     def rows(self):
@@ -153,9 +271,70 @@ class Worksheet(object):
     def frozen_cols(self, cols):
         self.set_frozen_size(self.frozen_rows, cols)
 
+    def _get_values(self, start_row, end_row, start_col, end_col,
+                    render_options):
+        value_render_option, date_time_render_option = render_options
+        range_str = util.format_range_a1_notation(
+            self.title, start_row, end_row, start_col, end_col)
+        response = self._api.sheets.spreadsheets().values().get(
+            spreadsheetId=self._spreadsheet.key,
+            range=py3.str_to_native_str(range_str, encoding='utf-8'),
+            majorDimension='ROWS',
+            valueRenderOption=value_render_option,
+            dateTimeRenderOption=date_time_render_option).execute()
+        return response.get('values', [])
+
+    def _get_cell_cache(self, render_options):
+        cache = self._cell_caches.get(render_options)
+        if cache is None:
+            cache = self._cell_caches[render_options] = util.CellCache()
+        return cache
+
+    def _store_cell_values(self, row, col, values, render_options=None):
+        """Stores values of a rectangle of cells in cell caches.
+
+        If |render_options| is given, values are stored in the cache for them
+        and the cells are invalidated in other caches, since the values may be
+        rendered differently there.
+        """
+        for cache_render_options, cache in self._cell_caches.items():
+            if render_options in (None, cache_render_options):
+                cache.store(row, col, values)
+            else:
+                cache.invalidate(
+                    row, row + len(values), col, col + len(values[0]))
+
+    def _invalidate_cells(self, start_row, end_row, start_col, end_col):
+        for cache in self._cell_caches.values():
+            cache.invalidate(start_row, end_row, start_col, end_col)
+
+    def _invalidate_cell_caches(self):
+        for cache in self._cell_caches.values():
+            cache.clear()
+
+    def _update_properties(self, properties, fields):
+        new_entry = self._make_single_batch_request(
+            'updateSheetProperties',
+            {
+                'properties': dict(properties, sheetId=self.key),
+                'fields': fields,
+            })
+        if new_entry is None:
+            # The request is queued in Spreadsheet.batch(). Apply the change
+            # locally so that later changes in the batch see it.
+            util.merge_dict(self._entry['properties'], properties)
+            if 'title' in properties:
+                self._spreadsheet._reindex_worksheets()
+        else:
+            self.refresh(new_entry)
+
     def _make_single_batch_request(self, method, params):
         spreadsheet_entry = self._spreadsheet._make_single_batch_request(
             method, params)
+        if spreadsheet_entry is None:
+            return None
+        # Keeps the spreadsheet and sibling worksheets up to date too.
+        self._spreadsheet.refresh(spreadsheet_entry)
         for entry in spreadsheet_entry['sheets']:
             if entry['properties']['sheetId'] == self.key:
                 return entry
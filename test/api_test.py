@@ -42,6 +42,24 @@ class APITest(unittest.TestCase):
             http_mocks.ReplayHttp(None),
             discovery=False)
 
+    def test_fields(self):
+        api = hyou.api.API(
+            http_mocks.ReplayHttp(None),
+            discovery=False)
+        self.assertEqual(
+            'spreadsheetId,properties/title,'
+            'sheets/properties(sheetId,title,index,gridProperties)',
+            api.spreadsheet_fields)
+        self.assertEqual('modifiedDate', api.file_fields)
+        api = hyou.api.API(
+            http_mocks.ReplayHttp(None),
+            discovery=False,
+            extra_spreadsheet_fields=('sheets/protectedRanges',),
+            extra_file_fields=('owners',))
+        self.assertTrue(
+            api.spreadsheet_fields.endswith(',sheets/protectedRanges'))
+        self.assertEqual('modifiedDate,owners', api.file_fields)
+
     def test_discovery(self):
         with suppress_oauth2client_warnings():
             hyou.api.API(
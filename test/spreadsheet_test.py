@@ -18,8 +18,11 @@ from __future__ import (
 import datetime
 import unittest
 
+import mock
+
 import hyou.api
 import hyou.collection
+import hyou.spreadsheet
 
 import http_mocks
 
@@ -78,7 +81,12 @@ class SpreadsheetReadOnlyTest(unittest.TestCase):
         self.assertEqual('Sheet3', self.spreadsheet['Sheet3'].title)
 
     def test_refresh(self):
+        worksheet2 = self.spreadsheet['Sheet2']
         self.spreadsheet.refresh()
+        # Worksheet objects are updated in place.
+        self.assertIs(worksheet2, self.spreadsheet['Sheet2'])
+        self.assertIsNot(
+            worksheet2._entry, self.spreadsheet['Sheet3']._entry)
 
     def test_url(self):
         self.assertEqual(
@@ -116,3 +124,70 @@ class SpreadsheetReadWriteTest(unittest.TestCase):
         self.assertEqual(2, worksheet.rows)
         self.assertEqual(8, worksheet.cols)
         self.spreadsheet.delete_worksheet('Sheet9')
+
+    def test_batch(self):
+        worksheet = self.spreadsheet['Sheet1']
+        with self.spreadsheet.batch():
+            self.spreadsheet.title = 'SpreadsheetReadWriteTest'
+            worksheet.rows = 500
+            worksheet.cols = 10
+            self.assertEqual(500, worksheet.rows)
+            self.assertEqual(10, worksheet.cols)
+            self.assertIsNone(
+                self.spreadsheet.add_worksheet('Sheet9', rows=2, cols=8))
+        self.assertEqual(['Sheet1', 'Sheet9'], self.spreadsheet.keys())
+        self.assertEqual(10, self.spreadsheet['Sheet1'].cols)
+        self.assertEqual(8, self.spreadsheet['Sheet9'].cols)
+
+    def test_batch_exception(self):
+        worksheet = self.spreadsheet['Sheet1']
+        with self.assertRaises(ValueError):
+            with self.spreadsheet.batch():
+                self.spreadsheet.title = 'Renamed'
+                worksheet.frozen_rows = 1
+                raise ValueError()
+        self.assertEqual('SpreadsheetReadWriteTest', self.spreadsheet.title)
+        self.assertEqual(0, worksheet.frozen_rows)
+
+    def test_batch_exception_new_worksheet(self):
+        with self.assertRaises(ValueError):
+            with self.spreadsheet.batch():
+                worksheet = self.spreadsheet['Sheet1']
+                worksheet.title = 'Renamed'
+                self.assertEqual(['Renamed'], self.spreadsheet.keys())
+                self.assertIs(worksheet, self.spreadsheet.get('Renamed'))
+                worksheet.rows = 10
+                raise ValueError()
+        self.assertEqual('Sheet1', worksheet.title)
+        self.assertEqual(1000, worksheet.rows)
+        self.assertEqual(['Sheet1'], self.spreadsheet.keys())
+
+    def test_batch_send_failure(self):
+        worksheet = self.spreadsheet['Sheet1']
+        with mock.patch.object(
+                hyou.spreadsheet.Spreadsheet, '_batch_update',
+                side_effect=ValueError()):
+            with self.assertRaises(ValueError):
+                with self.spreadsheet.batch():
+                    worksheet.title = 'X'
+                    worksheet.rows = 5
+        self.assertEqual('Sheet1', worksheet.title)
+        self.assertEqual(1000, worksheet.rows)
+        self.assertEqual(['Sheet1'], self.spreadsheet.keys())
+
+    def test_local_metadata_updates(self):
+        self.assertFalse(self.spreadsheet.local_metadata_updates)
+        self.spreadsheet.local_metadata_updates = True
+        self.spreadsheet.title = 'SpreadsheetReadWriteTest'
+        worksheet = self.spreadsheet.add_worksheet('Sheet9', rows=2, cols=8)
+        self.assertEqual(8, worksheet.cols)
+        self.assertEqual(1, worksheet._entry['properties']['index'])
+        worksheet.cols = 5
+        self.assertEqual(5, self.spreadsheet['Sheet9'].cols)
+        self.spreadsheet.delete_worksheet('Sheet9')
+        self.assertEqual(['Sheet1'], self.spreadsheet.keys())
+        with self.spreadsheet.batch():
+            self.spreadsheet['Sheet1'].frozen_rows = 1
+        self.assertEqual(1, self.spreadsheet['Sheet1'].frozen_rows)
+        with self.assertRaises(TypeError):
+            self.spreadsheet.local_metadata_updates = 1
@@ -17,6 +17,7 @@
 from __future__ import (
     absolute_import, division, print_function, unicode_literals)
 
+import datetime
 import os
 import unittest
 
@@ -49,6 +50,69 @@ class MiscUtilsTest(unittest.TestCase):
             hyou.util.format_range_a1_notation("ねこ", 1, 5, 3, 7)
             == "'ねこ'!D2:G5")
 
+    def test_serial_to_datetime(self):
+        self.assertEqual(
+            datetime.datetime(1899, 12, 30),
+            hyou.util.serial_to_datetime(0))
+        self.assertEqual(
+            datetime.datetime(2017, 2, 8, 18),
+            hyou.util.serial_to_datetime(42774.75))
+
+    def test_coalesce_cells(self):
+        self.assertEqual([], hyou.util.coalesce_cells({}))
+        self.assertEqual(
+            [(1, 2, 3, 4, [['a']])],
+            hyou.util.coalesce_cells({(1, 3): 'a'}))
+        # A full block becomes a single rectangle.
+        self.assertEqual(
+            [(0, 2, 0, 3, [['a', 'b', 'c'], ['d', 'e', 'f']])],
+            hyou.util.coalesce_cells({
+                (0, 0): 'a', (0, 1): 'b', (0, 2): 'c',
+                (1, 0): 'd', (1, 1): 'e', (1, 2): 'f'}))
+        # Gaps split rows and columns.
+        self.assertEqual(
+            [(0, 1, 0, 2, [['a', 'b']]),
+             (0, 2, 3, 4, [['c'], ['e']]),
+             (1, 2, 0, 1, [['d']]),
+             (3, 4, 3, 4, [['f']])],
+            hyou.util.coalesce_cells({
+                (0, 0): 'a', (0, 1): 'b', (0, 3): 'c',
+                (1, 0): 'd', (1, 3): 'e',
+                (3, 3): 'f'}))
+
+
+class PrefetchMapTest(unittest.TestCase):
+
+    def test_prefetch_map(self):
+        self.assertEqual(
+            [1, 4, 9],
+            list(hyou.util.prefetch_map(lambda x: x * x, [1, 2, 3])))
+        self.assertEqual([], list(hyou.util.prefetch_map(abs, [])))
+
+    def test_prefetch_map_error(self):
+        it = hyou.util.prefetch_map(lambda x: 1 // x, [1, 0])
+        self.assertEqual(1, py3.next(it))
+        self.assertRaises(ZeroDivisionError, py3.next, it)
+
+
+class CellCacheTest(unittest.TestCase):
+
+    def test_cell_cache(self):
+        cache = hyou.util.CellCache()
+        self.assertIsNone(cache.get(0, 0))
+        cache.store(1, 1, [['a', 'b']])
+        self.assertEqual('b', cache.get(1, 2))
+        self.assertIsNone(cache.get_row(1, 0, 3))
+        self.assertFalse(cache.is_filled(1, 2, 0, 3))
+        cache.store(1, 0, [['x']])
+        self.assertEqual(['x', 'a', 'b'], cache.get_row(1, 0, 3))
+        self.assertTrue(cache.is_filled(1, 2, 0, 3))
+        cache.invalidate(0, 2, 2, 5)
+        self.assertEqual(['x', 'a'], cache.get_row(1, 0, 2))
+        self.assertIsNone(cache.get(1, 2))
+        cache.clear()
+        self.assertIsNone(cache.get(1, 0))
+
 
 class ParseCredentialsTest(unittest.TestCase):
 
@@ -158,6 +222,37 @@ class LazyOrderedDictionaryTest(unittest.TestCase):
         self.enumerator.return_value = [('B', 'banana')]
         self.assertRaises(KeyError, self.dict.__getitem__, 'A')
 
+    def test_enumerate_streaming(self):
+        consumed = []
+
+        def enumerate_items():
+            for key, value in [('A', 'apple'), ('B', 'banana'),
+                               ('C', 'cinamon')]:
+                consumed.append(key)
+                yield (key, value)
+
+        self.enumerator.side_effect = enumerate_items
+        self.constructor.return_value = 'bacon'
+        self.assertEqual('bacon', self.dict['B'])
+        it = self.dict.iteritems()
+        self.assertEqual(('A', 'apple'), py3.next(it))
+        self.assertEqual(['A'], consumed)
+        self.assertEqual(('B', 'bacon'), py3.next(it))
+        self.assertEqual('apple', self.dict['A'])
+        self.assertEqual(['A', 'B', 'C'], self.dict.keys())
+        self.assertEqual(('C', 'cinamon'), py3.next(it))
+        self.assertRaises(StopIteration, py3.next, it)
+        self.assertEqual(1, self.enumerator.call_count)
+
+    def test_no_constructor_streaming(self):
+        self.dict = hyou.util.LazyOrderedDictionary(
+            enumerator=self.enumerator, constructor=None)
+        self.enumerator.return_value = [('A', 'apple'), ('B', 'banana')]
+        self.assertEqual('apple', self.dict['A'])
+        self.assertEqual('banana', self.dict['B'])
+        self.assertRaises(KeyError, self.dict.__getitem__, 'C')
+        self.assertEqual(['A', 'B'], self.dict.keys())
+
     def test_get(self):
         self.enumerator.return_value = [('A', 'apple')]
         self.constructor.return_value = None
@@ -17,10 +17,25 @@ from __future__ import (
 
 import unittest
 
+import mock
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+try:
+    import pandas
+except ImportError:
+    pandas = None
+
+import hyou
 import hyou.api
 import hyou.collection
+import hyou.exception
 from hyou import py3
 import hyou.util
+import hyou.view
+import hyou.worksheet
 
 import http_mocks
 
@@ -114,6 +129,14 @@ class WorksheetReadOnlyTest(unittest.TestCase):
         with self.assertRaises(IndexError):
             self.view[-3][0]
 
+    def test_lazy_rows(self):
+        view = hyou.view.View(
+            self.worksheet1, self.api, 0, 1000000, 0, 5)
+        self.assertEqual(1000000, len(view))
+        self.assertEqual(5, len(view[999999]))
+        self.assertFalse(hasattr(view, '__dict__'))
+        self.assertFalse(hasattr(view[0], '__dict__'))
+
     def test_nonzero(self):
         self.assertTrue(self.view[0:1])
         self.assertFalse(self.view[0:0])
@@ -143,6 +166,94 @@ class WorksheetReadOnlyTest(unittest.TestCase):
                  ['maki', 'nozomi', 'hanayo', 'niko', '']]),
             repr(self.view))
 
+    @unittest.skipIf(numpy is None, 'numpy is not available')
+    def test_to_numpy(self):
+        array = self.view.to_numpy(dtype=py3.str)
+        self.assertEqual((2, 5), array.shape)
+        self.assertEqual('honoka', array[0][0])
+        self.assertEqual('', array[1][4])
+        with self.assertRaises(ValueError):
+            self.view.to_numpy()
+
+    @unittest.skipIf(pandas is None, 'pandas is not available')
+    def test_to_dataframe(self):
+        data_frame = self.view.to_dataframe()
+        self.assertEqual(
+            ['honoka', 'eri', 'kotori', 'umi', 'rin'],
+            list(data_frame.columns))
+        self.assertEqual(['maki'], list(data_frame['honoka']))
+        self.assertEqual([''], list(data_frame['rin']))
+        data_frame = self.view.to_dataframe(header=False)
+        self.assertEqual((2, 5), data_frame.shape)
+        self.assertEqual(['honoka', 'maki'], list(data_frame[0]))
+        data_frame = self.worksheet1.view(end_row=1).to_dataframe()
+        self.assertEqual((0, 5), data_frame.shape)
+
+    def test_fetch_rows(self):
+        view = self.worksheet1.view(fetch_rows=1)
+        self.assertEqual('maki', view[1][0])
+        self.assertEqual('', view[1][4])
+        self.assertEqual(['honoka', 'eri', 'kotori', 'umi', 'rin'], view[0])
+        with self.assertRaises(ValueError):
+            self.worksheet1.view(fetch_rows=0)
+
+    def test_render_options(self):
+        view = self.worksheet1.view(
+            value_render_option='UNFORMATTED_VALUE',
+            date_time_render_option='SERIAL_NUMBER')
+        self.assertEqual('honoka', view[0][0])
+        hyou.fetch_all(self.worksheet1.view(
+            start_row=1, value_render_option='UNFORMATTED_VALUE'))
+
+    def test_fetch_all(self):
+        view1 = self.worksheet1.view(end_row=1, end_col=2)
+        view2 = self.worksheet1.view(start_row=1, start_col=2, fetch_rows=1)
+        hyou.fetch_all(view1, view2, self.view)
+        self.assertEqual([['honoka', 'eri']], view1)
+        self.assertEqual([['hanayo', 'niko', '']], view2)
+        self.assertEqual('maki', self.view[1][0])
+        # Already fetched views are skipped.
+        hyou.fetch_all(view1, view2)
+
+    def test_shared_cache(self):
+        self.assertEqual('honoka', self.view[0][0])
+        view = self.worksheet1.view(start_row=1, start_col=1)
+        with mock.patch.object(
+                hyou.worksheet.Worksheet, '_get_values',
+                side_effect=AssertionError('unexpected fetch')):
+            self.assertEqual([['nozomi', 'hanayo', 'niko', '']], view)
+        # Views with other render options do not share cells.
+        view = self.worksheet1.view(value_render_option='UNFORMATTED_VALUE')
+        self.assertEqual('honoka', view[0][0])
+
+    def test_refresh_metadata(self):
+        self.assertEqual('honoka', self.view[0][0])
+        # Refreshing a worksheet from the server discards its cached cells.
+        for refresh in (self.spreadsheet.refresh, self.worksheet1.refresh):
+            refresh()
+            with mock.patch.object(
+                    hyou.worksheet.Worksheet, '_get_values',
+                    return_value=[['honoka']]) as get_values:
+                self.assertEqual('honoka', self.worksheet1.view()[0][0])
+                self.assertTrue(get_values.called)
+
+    def test_sub_view(self):
+        self.assertEqual('honoka', self.view[0][0])
+        with mock.patch.object(
+                hyou.worksheet.Worksheet, '_get_values',
+                side_effect=AssertionError('unexpected fetch')):
+            sub_view = self.view[1:, 1:3]
+            self.assertEqual([['nozomi', 'hanayo']], sub_view)
+            self.assertEqual((1, 2, 1, 3), (
+                sub_view.start_row, sub_view.end_row,
+                sub_view.start_col, sub_view.end_col))
+            self.assertEqual([['hanayo']], sub_view[:, -1:])
+            self.assertEqual(0, len(self.view[2:, :]))
+        with self.assertRaises(NotImplementedError):
+            self.view[::2, :]
+        with self.assertRaises(TypeError):
+            self.view[0, 0]
+
     def test_properties(self):
         self.assertEqual(0, self.view.start_row)
         self.assertEqual(2, self.view.end_row)
@@ -191,6 +302,18 @@ class WorksheetReadWriteTest(unittest.TestCase):
                 ['maki', 'nozomi', 'hanayo', 'niko']]
         self.view.commit()
 
+    def test_assign(self):
+        self.view.assign([['nicco', 28], [None, 'nya']], row=0, col=3)
+        self.assertEqual(['kotori', 'nicco', '28'], self.view[0][2:])
+        self.assertEqual(['hanayo', '', 'nya'], self.view[1][2:])
+        with self.assertRaises(ValueError):
+            self.view.assign([['a', 'b'], ['c']])
+        with self.assertRaises(ValueError):
+            self.view.assign([['a', 'b']], row=1, col=4)
+        self.view.assign([])
+        self.assertEqual(1, len(self.view._queued_updates))
+        self.view.commit()
+
     def test_write_nonstr(self):
         self.view[0][0] = 28
         self.view[0][1] = 28.3
@@ -202,6 +325,136 @@ class WorksheetReadWriteTest(unittest.TestCase):
         self.view[1][4] = None
         self.view.commit()
 
+    @unittest.skipIf(numpy is None, 'numpy is not available')
+    def test_numpy(self):
+        array = numpy.array([[1, 2.5, numpy.nan, 4, 5], [6, 7, 8, 9, 10]])
+        self.view.assign_numpy(array)
+        self.assertEqual('2.5', self.view[0][1])
+        self.assertEqual('', self.view[0][2])
+        numpy.testing.assert_array_equal(array, self.view.to_numpy())
+        self.view.assign_numpy(numpy.array([[True, False]]), row=1, col=3)
+        self.assertEqual(['6.0', '7.0', '8.0', '1', '0'], self.view[1])
+        with self.assertRaises(ValueError):
+            self.view.assign_numpy(numpy.zeros(5))
+        with self.assertRaises(ValueError):
+            self.view.assign_numpy(numpy.zeros((2, 2)), row=1)
+        self.view.commit()
+
+    def test_write_batch(self):
+        with self.spreadsheet.write_batch():
+            view1 = self.worksheet1.view(end_row=1)
+            view2 = self.worksheet1.view(start_row=1, start_col=3)
+            view1[0][0] = 'yukiho'
+            view1.commit()
+            view2[0][0] = 'nico'
+            with self.spreadsheet.write_batch():
+                view2[0][1] = 'arisa'
+        self.assertEqual(0, len(view1._queued_updates))
+        self.assertEqual(0, len(view2._queued_updates))
+
+    def test_write_batch_exception(self):
+        with self.assertRaises(ValueError):
+            with self.spreadsheet.write_batch():
+                view = self.worksheet1.view()
+                view[0][0] = 'yukiho'
+                raise ValueError()
+        self.assertEqual(1, len(view._queued_updates))
+
+    def test_skip_unchanged(self):
+        view = self.worksheet1.view(skip_unchanged=True)
+        view[0][0] = 'honoka'
+        self.assertEqual('honoka', view[0][0])
+        view[0][0] = 'honoka'
+        view[0][1] = 'arisa'
+        view[0][1] = 'eri'
+        view[1][:] = ['maki', 'nozomi', 'hanayo', 'nico', 'yukiho']
+        view.commit()
+        self.assertEqual(0, len(view._queued_updates))
+        with mock.patch.object(
+                hyou.worksheet.Worksheet, '_get_values',
+                return_value=[
+                    ['honoka', 'eri', 'kotori', 'umi', 'rin'],
+                    ['maki', 'nozomi', 'hanayo', 'nico', 'yukiho']]):
+            view[1][4] = 'yukiho'
+        # Nothing to send.
+        self.assertEqual(0, len(view._queued_updates))
+
+    def test_skip_unchanged_numbers(self):
+        for value_input_option in ('USER_ENTERED', 'RAW'):
+            view = self.worksheet1.view(
+                skip_unchanged=True, value_render_option='UNFORMATTED_VALUE',
+                value_input_option=value_input_option)
+            with mock.patch.object(
+                    hyou.worksheet.Worksheet, '_get_values',
+                    return_value=[[1, 28.3, True, 'umi', 'rin']]):
+                view[0][:3] = [1, 28.3, True]
+                self.assertEqual(0, len(view._queued_updates))
+                view[0][1] = 28.4
+                self.assertEqual(1, len(view._queued_updates))
+
+    def test_commit_include_values(self):
+        self.view[1][4] = '=1+1'
+        self.view[0][4] = 'rin'
+        self.view.commit(include_values=True)
+        self.assertEqual('2', self.view[1][4])
+        self.assertEqual('rin', self.view[0][4])
+        self.assertEqual('nico', self.view[1][3])
+
+    def test_clear(self):
+        self.view[0][0] = 'yukiho'
+        self.view.clear()
+        self.assertEqual(['', '', '', '', ''], self.view[0])
+        self.assertEqual(0, len(self.view._queued_updates))
+        self.view.commit()
+        view1 = self.worksheet1.view(end_row=1, start_col=3)
+        view2 = self.worksheet1.view(start_row=1, end_col=2)
+        self.spreadsheet.clear_ranges(
+            [view1, view2, self.worksheet1.view(end_row=0)])
+        self.assertEqual([['', '']], view1)
+        self.assertEqual([['', '']], view2)
+
+    def test_clear_ranges_foreign_view(self):
+        other_view = self.collection[
+            '18OLN5A2SSKAeYLXw4SnZxU1yRJnMdf_ZCjc0D2UdhX8']['Sheet1'].view()
+        with mock.patch.object(
+                hyou.worksheet.Worksheet, '_get_values',
+                side_effect=AssertionError('unexpected fetch')):
+            with self.assertRaises(ValueError) as context:
+                self.spreadsheet.clear_ranges([other_view])
+        self.assertIn("'Sheet1'!A1:E2", str(context.exception))
+
+    def test_write_before_fetch(self):
+        self.view[0][0] = 'yukiho'
+        self.assertEqual('yukiho', self.view[0][0])
+        self.assertEqual('eri', self.view[0][1])
+        self.assertEqual(
+            ['yukiho', 'eri', 'kotori', 'umi', 'rin'], self.view[0])
+
+    def test_write_raw(self):
+        view = self.worksheet1.view(value_input_option='RAW')
+        view[0][0] = 28
+        view[0][1] = 2.5
+        view[0][2] = True
+        view[0][3] = float('nan')
+        view[0][4] = None
+        self.assertEqual([28, 2.5, True, 'nan', ''], view[0][:])
+        with self.spreadsheet.write_batch():
+            view1 = self.worksheet1.view(end_row=1)
+            view2 = self.worksheet1.view(
+                start_row=1, value_input_option='RAW')
+            view1[0][0] = 28
+            view2[0][0] = 28
+        view.commit()
+
+    @unittest.skipIf(numpy is None, 'numpy is not available')
+    def test_numpy_raw(self):
+        view = self.worksheet1.view(value_input_option='RAW')
+        view.assign_numpy(numpy.array([[1, 2.5, numpy.nan, numpy.inf]]))
+        view.assign_numpy(numpy.array([[True, 28]]), row=1)
+        self.assertEqual([1.0, 2.5, '', 'inf', 'rin'], view[0])
+        self.assertEqual([1, 28], view[1][:2])
+        view.commit()
+
     def test_refresh(self):
         self.assertEqual('honoka', self.view[0][0])
 
@@ -212,3 +465,112 @@ class WorksheetReadWriteTest(unittest.TestCase):
         self.view.refresh()
 
         self.assertEqual('honoka', self.view[0][0])
+
+    def test_sort(self):
+        self.assertEqual('honoka', self.view[0][0])
+        self.view[1][3] = 'nicco'
+        self.view.sort(by_columns=[1, 0], ascending=[False, True])
+        self.assertEqual([], self.view._queued_updates)
+        self.assertEqual('honoka', self.view[0][0])
+        self.view.sort()
+        with self.assertRaises(ValueError):
+            self.view.sort(by_columns=[0], ascending=[True, False])
+        with self.assertRaises(IndexError):
+            self.view.sort(by_columns=[5])
+        with self.assertRaises(ValueError):
+            self.view.sort(by_columns=[])
+        with self.spreadsheet.write_batch():
+            view = self.worksheet1.view()
+            with self.assertRaises(hyou.exception.HyouRuntimeError):
+                view.sort()
+
+    def test_sort_local(self):
+        self.view.sort(key=lambda row: row[4])
+        self.assertEqual(
+            [(0, 2, 0, 5, [['maki', 'nozomi', 'hanayo', 'nico', ''],
+                           ['honoka', 'eri', 'kotori', 'umi', 'rin']])],
+            self.view._make_update_rects())
+        with self.assertRaises(ValueError):
+            self.view.sort(key=len, by_columns=[0])
+        self.view.refresh()
+        self.view.sort(reverse=True)
+
+    def test_range_operations(self):
+        self.assertEqual(1, self.view.find_replace('nico', 'nicco'))
+        self.assertEqual(0, self.view.dedupe(columns=[0, 1]))
+        self.assertEqual(0, self.view.trim_whitespace())
+        self.assertEqual(0, self.view[:0, :].trim_whitespace())
+        with self.assertRaises(IndexError):
+            self.view.dedupe(columns=[-1])
+
+    def test_sub_view_commit(self):
+        sub_view = self.view[1:, 3:]
+        sub_view[0][0] = 'nicco'
+        self.view[0][0] = 'yukiho'
+        sub_view.commit()
+        self.assertEqual([], self.view._queued_updates)
+        with self.spreadsheet.write_batch():
+            view = self.worksheet1.view()
+            view[:1, :1][0][0] = 'yukiho'
+            view[1:, 3:][0][0] = 'nicco'
+
+    def test_sub_view_discard(self):
+        self.view[0] = ['a', 'b', 'c', 'd', 'e']
+        self.view[1][4] = 'keep me'
+        sub_view = self.view[:1, :1]
+        expected_rects = [
+            (0, 1, 1, 5, [['b', 'c', 'd', 'e']]),
+            (1, 2, 4, 5, [['keep me']]),
+        ]
+        # Updates queued for cells outside the sub-view are kept.
+        sub_view.refresh()
+        self.assertEqual(expected_rects, self.view._make_update_rects())
+        self.assertEqual('keep me', self.view[1][4])
+        self.view[0][0] = 'a'
+        sub_view.clear()
+        self.assertEqual(expected_rects, self.view._make_update_rects())
+
+    def test_commit_rendered_values(self):
+        self.view[0][0] = '=1+1'
+        self.view[0][1] = 28.3
+        self.view.commit()
+        # Input values are not cached as rendered values.
+        with mock.patch.object(
+                hyou.worksheet.Worksheet, '_get_values',
+                return_value=[['2', '28.3']]) as get_values:
+            self.assertEqual(['2', '28.3'], self.worksheet1.view()[0][:2])
+            self.assertTrue(get_values.called)
+
+    def test_uncommitted_write(self):
+        view = self.worksheet1.view()
+        view[0][0] = 'unsent'
+        del view
+        self.assertEqual('honoka', self.worksheet1.view()[0][0])
+
+    def test_refresh_overlapping_view(self):
+        view = self.worksheet1.view(end_row=1)
+        self.view[0][0] = 'pending'
+        view.refresh()
+        self.assertEqual('pending', self.view[0][0])
+        self.assertEqual(1, len(self.view._queued_updates))
+
+    def test_shared_write(self):
+        view = self.worksheet1.view(start_row=1, end_row=2)
+        self.view[1][0] = 'yukiho'
+        # Values are shared with other views only after they are sent.
+        self.assertEqual('maki', view[0][0])
+        self.view.commit()
+        # Committed cells are fetched again.
+        with mock.patch.object(
+                hyou.worksheet.Worksheet, '_get_values',
+                return_value=[['yukiho']]) as get_values:
+            self.assertEqual('yukiho', view[0][0])
+            get_values.assert_called_once_with(
+                1, 2, 0, 5, view._render_options)
+        # Refreshing a view discards cells in its range only.
+        self.assertEqual('honoka', self.view[0][0])
+        view.refresh()
+        with mock.patch.object(
+                hyou.worksheet.Worksheet, '_get_values',
+                side_effect=AssertionError('unexpected fetch')):
+            self.assertEqual('honoka', self.view[0][0])
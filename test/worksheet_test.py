@@ -17,6 +17,11 @@ from __future__ import (
 
 import unittest
 
+try:
+    import pandas
+except ImportError:
+    pandas = None
+
 import hyou.api
 import hyou.collection
 import hyou.util
@@ -50,6 +55,26 @@ class WorksheetReadOnlyTest(unittest.TestCase):
     def test_repr(self):
         self.assertEqual(str('Worksheet(key=0)'), repr(self.worksheet1))
 
+    def test_refresh(self):
+        self.worksheet1.refresh()
+        self.assertEqual(2, self.worksheet1.rows)
+        self.assertIs(self.worksheet1, self.spreadsheet['Sheet1'])
+        self.assertIs(
+            self.worksheet1._entry, self.spreadsheet._entry['sheets'][0])
+
+    def test_iter_rows(self):
+        expected = [
+            ['honoka', 'eri', 'kotori', 'umi', 'rin'],
+            ['maki', 'nozomi', 'hanayo', 'niko', '']]
+        self.assertEqual(expected, list(self.worksheet1.iter_rows()))
+        self.assertEqual(
+            expected, list(self.worksheet1.iter_rows(chunk_rows=1)))
+        self.assertEqual(
+            expected,
+            list(self.worksheet1.iter_rows(chunk_rows=1, prefetch=True)))
+        with self.assertRaises(ValueError):
+            list(self.worksheet1.iter_rows(chunk_rows=0))
+
     def test_view(self):
         self.worksheet1.view(start_row=3)
         self.worksheet1.view(end_row=-1)
@@ -76,8 +101,35 @@ class WorksheetReadWriteTest(unittest.TestCase):
     def test_set_title(self):
         self.worksheet1.title = 'Sheet1'
 
+    @unittest.skipIf(pandas is None, 'pandas is not available')
+    def test_write_dataframe(self):
+        data_frame = pandas.DataFrame(
+            [[28, 2.5, 'kotori'], [None, float('nan'), None]],
+            columns=['honoka', 'eri', 'kotori'])
+        with self.assertRaises(ValueError):
+            self.worksheet1.write_dataframe(data_frame)
+        self.worksheet1.write_dataframe(data_frame[:1], start_col=2)
+        self.worksheet1.write_dataframe(
+            data_frame, start_col=2, header=False)
+
+    def test_append_rows(self):
+        self.worksheet1.append_rows([['yukiho', 28]])
+        self.assertEqual(3, self.worksheet1.rows)
+        self.worksheet1.append_rows([['arisa', 2.5]], batch_size=2)
+        self.assertEqual(3, self.worksheet1.rows)
+        self.worksheet1.append_rows([['nico', None]], batch_size=2)
+        self.assertEqual(5, self.worksheet1.rows)
+        self.worksheet1.append_rows([['yukiho']], flush_interval=60)
+        self.worksheet1.append_rows(
+            [['yukiho', 28]], flush_interval=60, value_input_option='RAW')
+        self.worksheet1.flush_appended_rows()
+        self.assertEqual(7, self.worksheet1.rows)
+
     def test_set_size(self):
         self.worksheet1.set_size(2, 5)
+        self.assertIs(self.worksheet1, self.spreadsheet['Sheet1'])
+        self.assertIs(
+            self.worksheet1._entry, self.spreadsheet._entry['sheets'][0])
 
     def test_set_rows(self):
         self.worksheet1.rows = 2